@@ -377,10 +377,7 @@ def api_dashboard():
                     total_torrents += inst_info['torrent_count']
                     
                     # 获取剩余空间
-                    client = qb_manager.get_client(inst_id)
-                    if client:
-                        main_data = client.sync_maindata()
-                        inst_info['free_space'] = main_data.get('server_state', {}).get('free_space_on_disk', 0)
+                    inst_info['free_space'] = qb_manager.get_free_space(inst_id)
                 except Exception as e:
                     logger.warning(f"获取qB实例 {inst['name']} 状态失败: {e}")
             
@@ -470,13 +467,7 @@ def api_qb_instances():
                 inst['dl_speed'] = status.get('download_speed', 0)
             
             # 获取剩余空间
-            client = qb_manager.get_client(inst_id)
-            if client:
-                try:
-                    main_data = client.sync_maindata()
-                    inst['free_space'] = main_data.get('server_state', {}).get('free_space_on_disk', 0)
-                except:
-                    pass
+            inst['free_space'] = qb_manager.get_free_space(inst_id)
     
     return jsonify(instances)
 
@@ -11,10 +11,29 @@ import time
 import json
 import threading
 import logging
+from collections import deque
+from itertools import islice
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from dataclasses import dataclass
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    _json_loads = json.loads
+    ORJSON_AVAILABLE = False
+
+
+SIZE_UNITS = ('B', 'KiB', 'MiB', 'GiB', 'TiB', 'PiB')
+
 
 @dataclass
 class RemoveRecord:
@@ -28,30 +47,65 @@ class RemoveRecord:
     size: int
     uploaded: int
     ratio: float
+    time_str: str = ''  # 创建时格式化好的时间，记录不可变，查询时直接读取
+
+
+class _TorrentColumns(dict):
+    """按需把种子列表的某个字段转换为 float64 列（列式存储，只构建规则用到的字段）"""
+    
+    def __init__(self, torrents: List[Dict]):
+        super().__init__()
+        self._torrents = torrents
+    
+    def __missing__(self, field: str):
+        column = np.fromiter((t.get(field, 0) for t in self._torrents),
+                             dtype=np.float64, count=len(self._torrents))
+        self[field] = column
+        return column
 
 
 class AutoRemoveEngine:
+    # 种子数达到该值时使用NumPy整列匹配，太少时Python循环更快
+    VECTORIZE_MIN_TORRENTS = 64
+    
     def __init__(self, db, qb_manager, notifier=None):
         self.db = db
         self.qb_manager = qb_manager
         self.notifier = notifier
         self.logger = logging.getLogger("auto_remove")
         
-        self._running = False
+        self._running = False  # 仅用于状态展示，线程退出只看 _stop_event
         self._thread = None
         self._stop_event = threading.Event()
+        self._wake_event = threading.Event()  # 有新批次排队时唤醒工作线程
         
         self._check_interval = 60
         self._sleep_between = 5
         self._enabled = False
         self._reannounce_before_delete = True
         self._delete_files = True  # 新增：是否删除文件
+        self._max_batch_size = 50  # 单次删除API调用的最大种子数
+        self._reannounce_delay = 2  # 删前汇报后至少等待的秒数
+        
+        # 待删除队列: (到期时间monotonic, 实例, [(torrent, rule), ...])
+        self._pending_delete = deque()
+        self._pending_lock = threading.Lock()
+        self._config_version = None
         
-        self._remove_records = []
         self._max_records = 500
+        self._remove_records = deque(maxlen=self._max_records)
         
         self._total_removed = 0
         self._total_freed = 0
+        
+        # 规则编译缓存: rule_id -> (condition原文, 编译结果)
+        self._compiled_rules: Dict[Any, Tuple[str, Optional[Tuple]]] = {}
+        
+        # 按数据版本缓存的规则和实例
+        self._rules: List[Dict] = []
+        self._rules_version = None
+        self._instances: List[Dict] = []
+        self._instances_version = None
     
     def start(self):
         if self._running:
@@ -64,8 +118,10 @@ class AutoRemoveEngine:
             return
         
         self._running = True
-        self._stop_event.clear()
-        self._thread = threading.Thread(target=self._worker, daemon=True, name="AutoRemove")
+        # 每次启动使用新的事件，避免尚未退出的旧线程被clear()复活
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._worker, args=(self._stop_event,),
+                                        daemon=True, name="AutoRemove")
         self._thread.start()
         self.logger.info(f"自动删种引擎已启动 (间隔: {self._check_interval}秒)")
         self._log_db('INFO', '自动删种引擎已启动')
@@ -73,22 +129,34 @@ class AutoRemoveEngine:
     def stop(self):
         self._running = False
         self._stop_event.set()
+        self._wake_event.set()
+        self._clear_pending()
         self.logger.info("自动删种引擎已停止")
         self._log_db('INFO', '自动删种引擎已停止')
     
     def _load_config(self):
-        self._enabled = self.db.get_config('auto_remove_enabled') == 'true'
+        # 配置未变化时跳过读库
+        version = self.db.get_config_version()
+        if version == self._config_version:
+            return
+        
+        config = self.db.get_configs([
+            'auto_remove_enabled', 'auto_remove_interval', 'auto_remove_sleep',
+            'auto_remove_reannounce', 'auto_remove_delete_files',
+        ])
+        self._enabled = config.get('auto_remove_enabled') == 'true'
         try:
-            self._check_interval = int(self.db.get_config('auto_remove_interval') or 60)
+            self._check_interval = int(config.get('auto_remove_interval') or 60)
         except:
             self._check_interval = 60
         try:
-            self._sleep_between = int(self.db.get_config('auto_remove_sleep') or 5)
+            self._sleep_between = int(config.get('auto_remove_sleep') or 5)
         except:
             self._sleep_between = 5
-        self._reannounce_before_delete = self.db.get_config('auto_remove_reannounce') != 'false'
+        self._reannounce_before_delete = config.get('auto_remove_reannounce') != 'false'
         # 默认删除文件，除非明确设置为false
-        self._delete_files = self.db.get_config('auto_remove_delete_files') != 'false'
+        self._delete_files = config.get('auto_remove_delete_files') != 'false'
+        self._config_version = version
     
     def _log_db(self, level: str, message: str):
         try:
@@ -106,13 +174,13 @@ class AutoRemoveEngine:
             'delete_files': self._delete_files,
             'total_removed': self._total_removed,
             'total_freed': self._total_freed,
-            'recent_records': len(self._remove_records)
+            'recent_records': len(self._remove_records),
+            'pending_delete': sum(len(items) for _, _, items in list(self._pending_delete))
         }
     
     def get_records(self, limit: int = 100) -> List[Dict]:
-        records = self._remove_records[-limit:]
         return [{
-            'time': datetime.fromtimestamp(r.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+            'time': r.time_str,
             'instance': r.instance_name,
             'name': r.torrent_name[:50] + '...' if len(r.torrent_name) > 50 else r.torrent_name,
             'rule': r.rule_name,
@@ -120,7 +188,7 @@ class AutoRemoveEngine:
             'size': r.size,
             'uploaded': r.uploaded,
             'ratio': r.ratio
-        } for r in reversed(records)]
+        } for r in islice(reversed(self._remove_records), max(0, limit))]
     
     def set_config(self, interval: int = None, sleep_between: int = None, 
                    reannounce: bool = None, enabled: bool = None, delete_files: bool = None):
@@ -136,29 +204,59 @@ class AutoRemoveEngine:
         if enabled is not None:
             self._enabled = enabled
             self.db.set_config('auto_remove_enabled', 'true' if enabled else 'false')
+            if not enabled:
+                self._clear_pending()
         if delete_files is not None:
             self._delete_files = delete_files
             self.db.set_config('auto_remove_delete_files', 'true' if delete_files else 'false')
     
-    def _worker(self):
-        while self._running and not self._stop_event.is_set():
+    def _worker(self, stop_event: threading.Event):
+        next_check = 0.0
+        while not stop_event.is_set():
             try:
-                self._load_config()
-                
-                if self._enabled:
-                    self._check_and_remove()
+                if time.monotonic() >= next_check:
+                    self._load_config()
+                    next_check = time.monotonic() + self._check_interval
+                    
+                    if self._enabled:
+                        self._check_and_remove(stop_event)
+                    else:
+                        self._clear_pending()
+                elif self._enabled:
+                    # 检查间隔未到，只删除已到期的批次
+                    self._flush_pending_deletes(stop_event)
+                else:
+                    self._clear_pending()
             except Exception as e:
                 self.logger.error(f"删种检查异常: {e}")
                 self._log_db('ERROR', f'检查异常: {e}')
             
-            self._stop_event.wait(self._check_interval)
+            # 有待删除批次时在其到期时醒来，而不是等满一个检查间隔；
+            # 先清除唤醒标记再计算，之后（如手动检查）排队的批次会立即唤醒线程重新计算
+            self._wake_event.clear()
+            if stop_event.is_set():
+                break
+            timeout = next_check - time.monotonic()
+            due_at = self._next_due_at()
+            if due_at is not None:
+                timeout = min(timeout, due_at - time.monotonic())
+            self._wake_event.wait(max(0.0, timeout))
     
-    def _check_and_remove(self):
-        rules = self.db.get_enabled_remove_rules()
+    def _check_and_remove(self, stop_event: Optional[threading.Event] = None):
+        # 中途检查只看本线程启动时的事件，stop()后立即start()也不会让旧线程继续删除
+        if stop_event is None:
+            stop_event = self._stop_event
+        
+        # 上一轮已完成删前汇报的种子在这里真正删除
+        self._flush_pending_deletes(stop_event)
+        
+        rules = self._get_rules()
         if not rules:
             return
         
-        instances = self.db.get_qb_instances()
+        instances = self._get_instances()
+        now = time.time()
+        pending_hashes = self._pending_hashes()
         
         for inst in instances:
             if not inst.get('enabled'):
@@ -168,143 +266,320 @@ class AutoRemoveEngine:
             if not self.qb_manager.is_connected(inst_id):
                 continue
             
+            # 剩余空间在单个实例内不变，只在这里判断一次
             free_space = self.qb_manager.get_free_space(inst_id)
-            torrents = self.qb_manager.get_torrents(inst_id)
+            applicable_rules = [r for r in rules
+                                if r['_free_space_lt'] is None or free_space < r['_free_space_lt']]
             
-            for torrent in torrents:
-                matched_rule = self._match_rules(torrent, rules, free_space)
-                if matched_rule:
-                    self._remove_torrent(inst, torrent, matched_rule, free_space)
-                    
-                    if self._sleep_between > 0:
-                        time.sleep(self._sleep_between)
-                    
-                    if not self._running:
-                        return
+            # 空间充足、没有规则适用时无需拉取种子列表
+            if not applicable_rules:
+                continue
+            
+            # 所有适用规则都要求已完成时，让qB在服务端过滤掉未完成的种子
+            if all(r['_completed'] for r in applicable_rules):
+                torrents = self.qb_manager.get_torrents(inst_id, filter='completed')
+            else:
+                torrents = self.qb_manager.get_torrents(inst_id)
+            
+            if NUMPY_AVAILABLE and len(torrents) >= self.VECTORIZE_MIN_TORRENTS:
+                to_delete = self._match_rules_vectorized(torrents, applicable_rules, now)
+            else:
+                to_delete = []
+                for torrent in torrents:
+                    matched_rule = self._match_rules(torrent, applicable_rules, now)
+                    if matched_rule:
+                        to_delete.append((torrent, matched_rule))
+            
+            if pending_hashes:
+                to_delete = [item for item in to_delete if item[0].get('hash') not in pending_hashes]
+            
+            # 按批次排队删除，每批一次API调用
+            for i in range(0, len(to_delete), self._max_batch_size):
+                if stop_event.is_set():
+                    return
+                
+                self._queue_removal(inst, to_delete[i:i + self._max_batch_size])
+        
+        # 不需要删前汇报的批次已经到期，立即删除
+        self._flush_pending_deletes(stop_event)
     
-    def _match_rules(self, torrent: Dict, rules: List[Dict], free_space: int) -> Optional[Dict]:
-        for rule in rules:
+    def _queue_removal(self, instance: Dict, items: List[Tuple[Dict, Dict]]):
+        """
+        删除第一阶段: 汇报整批种子并放入待删除队列
+        
+        汇报后需要等待tracker处理，工作线程在批次到期时醒来，
+        由 _flush_pending_deletes 完成删除，不再阻塞工作线程。
+        """
+        due_at = time.monotonic()
+        
+        # 删前汇报（一次请求汇报整批种子）
+        if self._reannounce_before_delete:
+            hashes = [torrent.get('hash', '') for torrent, _ in items]
             try:
-                condition = json.loads(rule.get('condition', '{}'))
-            except:
+                self.qb_manager.reannounce(instance['id'], hashes)
+                self.logger.info(f"[{instance['name']}] 删前汇报: {len(hashes)} 个种子")
+            except Exception as e:
+                self.logger.warning(f"汇报失败: {e}")
+            due_at += self._reannounce_delay
+        
+        with self._pending_lock:
+            self._pending_delete.append((due_at, instance, items))
+        self._wake_event.set()
+    
+    def _flush_pending_deletes(self, stop_event: threading.Event):
+        """删除第二阶段: 删除已到期的批次，批次之间保留配置的间隔"""
+        first = True
+        while not stop_event.is_set():
+            with self._pending_lock:
+                if not self._pending_delete or self._pending_delete[0][0] > time.monotonic():
+                    return
+                _, instance, items = self._pending_delete.popleft()
+            
+            # 排队后规则被删除、修改或剩余空间已恢复的种子不再删除
+            items = self._filter_still_applicable(instance, items)
+            if not items:
                 continue
             
-            if self._check_condition(torrent, condition, free_space):
-                return rule
+            if not first and self._sleep_between > 0:
+                stop_event.wait(self._sleep_between)
+                if stop_event.is_set():
+                    return
+            first = False
+            
+            self._remove_torrents(instance, items)
+    
+    def _filter_still_applicable(self, instance: Dict,
+                                 items: List[Tuple[Dict, Dict]]) -> List[Tuple[Dict, Dict]]:
+        """只保留仍应删除的种子：匹配规则仍然启用、条件未变，且剩余空间条件仍然成立"""
+        current = {r.get('id'): r.get('condition') for r in self._get_rules()}
+        items = [(torrent, rule) for torrent, rule in items
+                 if rule.get('id') in current and current[rule.get('id')] == rule.get('condition')]
         
-        return None
+        if any(rule['_free_space_lt'] is not None for _, rule in items):
+            free_space = self.qb_manager.get_free_space(instance['id'])
+            items = [(torrent, rule) for torrent, rule in items
+                     if rule['_free_space_lt'] is None or free_space < rule['_free_space_lt']]
+        return items
+    
+    def _clear_pending(self):
+        """丢弃所有待删除批次（停止或禁用时）"""
+        with self._pending_lock:
+            self._pending_delete.clear()
+    
+    def _next_due_at(self) -> Optional[float]:
+        """最早到期的待删除批次的时间，没有待删除批次时返回None"""
+        with self._pending_lock:
+            return self._pending_delete[0][0] if self._pending_delete else None
     
-    def _check_condition(self, torrent: Dict, condition: Dict, free_space: int) -> bool:
-        # 剩余空间条件
-        if 'free_space_lt' in condition:
-            if free_space >= condition['free_space_lt']:
-                return False
+    def _pending_hashes(self) -> set:
+        """已排队等待删除的种子hash"""
+        with self._pending_lock:
+            return {torrent.get('hash') for _, _, items in self._pending_delete for torrent, _ in items}
+    
+    def _get_rules(self) -> List[Dict]:
+        """获取已编译的启用规则，规则版本未变化时直接复用"""
+        version = self.db.get_remove_rules_version()
+        if version != self._rules_version:
+            self._rules = self._compile_rules(self.db.get_enabled_remove_rules())
+            self._rules_version = version
+        return self._rules
+    
+    def _get_instances(self) -> List[Dict]:
+        """获取qB实例配置，实例版本未变化时直接复用"""
+        version = self.db.get_qb_instances_version()
+        if version != self._instances_version:
+            self._instances = self.db.get_qb_instances()
+            self._instances_version = version
+        return self._instances
+    
+    def _compile_rules(self, rules: List[Dict]) -> List[Dict]:
+        """编译规则条件，返回可用的规则（条件无法解析的规则被跳过）"""
+        compiled = {}
+        result = []
+        for rule in rules:
+            raw = rule.get('condition') or '{}'
+            cached = self._compiled_rules.get(rule.get('id'))
+            if cached and cached[0] == raw:
+                compiled_rule = cached[1]
+            else:
+                compiled_rule = self._compile_rule(raw)
+            compiled[rule.get('id')] = (raw, compiled_rule)
+            
+            if compiled_rule is not None:
+                (rule['_free_space_lt'], rule['_completed'],
+                 rule['_compiled'], rule['_vector']) = compiled_rule
+                result.append(rule)
         
-        # 上传速度条件
-        if 'upload_speed_lt' in condition:
-            up_speed = torrent.get('upspeed', 0)
-            if up_speed >= condition['upload_speed_lt']:
-                return False
+        self._compiled_rules = compiled
+        return result
+    
+    @staticmethod
+    def _compile_rule(raw: str) -> Optional[Tuple[Optional[float], bool, List[Callable], List[Callable]]]:
+        """
+        把条件JSON编译为 (剩余空间阈值, 是否要求已完成, 谓词列表, 向量谓词列表)
+        
+        阈值在编译时绑定为默认参数；谓词按开销从低到高排序，
+        让最便宜的条件先把种子筛掉。剩余空间与种子无关，单独返回由调用方按实例判断。
+        向量谓词作用于 _TorrentColumns，一次判断整列种子，返回布尔数组。
+        """
+        try:
+            condition = _json_loads(raw)
+        except:
+            return None
+        
+        predicates = []  # (开销, 谓词, 向量谓词)
         
         # 已完成条件
         if condition.get('completed'):
-            progress = torrent.get('progress', 0)
-            if progress < 1.0:
-                return False
-        
-        # 做种时间条件
-        if 'seeding_time_gt' in condition:
-            seeding_time = torrent.get('seeding_time', 0)
-            if seeding_time <= condition['seeding_time_gt']:
-                return False
+            predicates.append((1,
+                lambda t, now: t.get('progress', 0) >= 1.0,
+                lambda c, now: c['progress'] >= 1.0))
         
         # 分享率条件
         if 'ratio_gt' in condition:
-            ratio = torrent.get('ratio', 0)
-            if ratio <= condition['ratio_gt']:
-                return False
+            thr = condition['ratio_gt']
+            predicates.append((2,
+                lambda t, now, thr=thr: t.get('ratio', 0) > thr,
+                lambda c, now, thr=thr: c['ratio'] > thr))
         
         # 种子大小条件
         if 'size_gt' in condition:
-            size = torrent.get('size', 0)
-            if size <= condition['size_gt']:
-                return False
+            thr = condition['size_gt']
+            predicates.append((2,
+                lambda t, now, thr=thr: t.get('size', 0) > thr,
+                lambda c, now, thr=thr: c['size'] > thr))
+        
+        # 做种时间条件
+        if 'seeding_time_gt' in condition:
+            thr = condition['seeding_time_gt']
+            predicates.append((2,
+                lambda t, now, thr=thr: t.get('seeding_time', 0) > thr,
+                lambda c, now, thr=thr: c['seeding_time'] > thr))
         
-        # 无连接时间条件
+        # 上传速度条件
+        if 'upload_speed_lt' in condition:
+            thr = condition['upload_speed_lt']
+            predicates.append((3,
+                lambda t, now, thr=thr: t.get('upspeed', 0) < thr,
+                lambda c, now, thr=thr: c['upspeed'] < thr))
+        
+        # 无连接时间条件（从未活动过的种子不受此条件限制）
         if 'no_peers_time_gt' in condition:
-            last_activity = torrent.get('last_activity', 0)
-            if last_activity > 0:
-                no_peer_time = time.time() - last_activity
-                if no_peer_time <= condition['no_peers_time_gt']:
-                    return False
+            thr = condition['no_peers_time_gt']
+            
+            def no_peers(t, now, thr=thr):
+                last_activity = t.get('last_activity', 0)
+                return last_activity <= 0 or now - last_activity > thr
+            
+            def no_peers_vector(c, now, thr=thr):
+                last_activity = c['last_activity']
+                return (last_activity <= 0) | (now - last_activity > thr)
+            
+            predicates.append((4, no_peers, no_peers_vector))
+        
+        predicates.sort(key=lambda item: item[0])
+        return (condition.get('free_space_lt'),
+                bool(condition.get('completed')),
+                [p for _, p, _ in predicates],
+                [v for _, _, v in predicates])
+    
+    def _match_rules(self, torrent: Dict, rules: List[Dict], now: float) -> Optional[Dict]:
+        for rule in rules:
+            if all(p(torrent, now) for p in rule['_compiled']):
+                return rule
+        
+        return None
+    
+    def _match_rules_vectorized(self, torrents: List[Dict], rules: List[Dict],
+                                now: float) -> List[Tuple[Dict, Dict]]:
+        """与 _match_rules 语义相同，但把种子字段转为列后按规则整列判断"""
+        columns = _TorrentColumns(torrents)
+        matched = np.full(len(torrents), -1, dtype=np.int32)  # 每个种子命中的规则下标
         
-        return True
+        for index, rule in enumerate(rules):
+            mask = matched < 0
+            # 谓词已按开销排序，掩码为空后剩余条件无需再算
+            for predicate in rule['_vector']:
+                if not mask.any():
+                    break
+                mask &= predicate(columns, now)
+            else:
+                matched[mask] = index
+                if (matched >= 0).all():
+                    break
+        
+        return [(torrents[i], rules[matched[i]]) for i in np.flatnonzero(matched >= 0)]
     
-    def _remove_torrent(self, instance: Dict, torrent: Dict, rule: Dict, free_space: int):
+    def _remove_torrents(self, instance: Dict, items: List[Tuple[Dict, Dict]]):
+        """批量删除同一实例上匹配的种子: items 为 [(torrent, rule), ...]"""
         inst_id = instance['id']
         inst_name = instance['name']
-        torrent_hash = torrent.get('hash', '')
-        torrent_name = torrent.get('name', 'Unknown')
-        
-        # 删前汇报
-        if self._reannounce_before_delete:
-            try:
-                self.qb_manager.reannounce(inst_id, torrent_hash)
-                self.logger.info(f"[{inst_name}] 删前汇报: {torrent_name[:30]}")
-                time.sleep(2)
-            except Exception as e:
-                self.logger.warning(f"汇报失败: {e}")
+        hashes = [torrent.get('hash', '') for torrent, _ in items]
         
         # 执行删除（使用配置决定是否删除文件）
-        self.logger.info(f"[{inst_name}] 准备删除: {torrent_name[:30]} (删除文件: {self._delete_files})")
-        success, msg = self.qb_manager.delete_torrent(inst_id, torrent_hash, delete_files=self._delete_files)
+        self.logger.info(f"[{inst_name}] 准备删除: {len(hashes)} 个种子 (删除文件: {self._delete_files})")
+        success, msg = self.qb_manager.delete_torrent(inst_id, hashes, delete_files=self._delete_files)
         
         if success:
-            size = torrent.get('size', 0)
-            uploaded = torrent.get('uploaded', 0)
-            ratio = torrent.get('ratio', 0)
-            
-            record = RemoveRecord(
-                timestamp=time.time(),
-                instance_id=inst_id,
-                instance_name=inst_name,
-                torrent_hash=torrent_hash,
-                torrent_name=torrent_name,
-                rule_name=rule['name'],
-                reason=rule.get('description', ''),
-                size=size,
-                uploaded=uploaded,
-                ratio=ratio
-            )
-            self._remove_records.append(record)
-            
-            if len(self._remove_records) > self._max_records:
-                self._remove_records = self._remove_records[-self._max_records:]
-            
-            self._total_removed += 1
-            self._total_freed += size
-            
-            self.logger.info(f"[{inst_name}] 删除: {torrent_name[:30]} | 规则: {rule['name']}")
-            self._log_db('INFO', f"删除 [{torrent_name[:30]}] 规则:{rule['name']} 大小:{self._fmt_size(size)}")
-            
-            if self.notifier:
-                try:
-                    self.notifier.notify(
-                        title="🗑️ 自动删种",
-                        message=f"📦 {torrent_name[:40]}\n📏 {self._fmt_size(size)}\n📊 分享率: {ratio:.2f}\n📋 规则: {rule['name']}"
-                    )
-                except:
-                    pass
+            for torrent, rule in items:
+                self._remove_torrent(instance, torrent, rule)
         else:
-            self.logger.error(f"[{inst_name}] 删除失败: {torrent_name[:30]} - {msg}")
-            self._log_db('ERROR', f"删除失败 [{torrent_name[:30]}]: {msg}")
+            for torrent, _ in items:
+                short_name = torrent.get('name', 'Unknown')[:30]
+                self.logger.error(f"[{inst_name}] 删除失败: {short_name} - {msg}")
+                self._log_db('ERROR', f"删除失败 [{short_name}]: {msg}")
+    
+    def _remove_torrent(self, instance: Dict, torrent: Dict, rule: Dict):
+        """记录一个已被删除的种子（统计、日志、通知）"""
+        inst_id = instance['id']
+        inst_name = instance['name']
+        torrent_hash = torrent.get('hash', '')
+        torrent_name = torrent.get('name', 'Unknown')
+        size = torrent.get('size', 0)
+        uploaded = torrent.get('uploaded', 0)
+        ratio = torrent.get('ratio', 0)
+        
+        now = time.time()
+        record = RemoveRecord(
+            timestamp=now,
+            instance_id=inst_id,
+            instance_name=inst_name,
+            torrent_hash=torrent_hash,
+            torrent_name=torrent_name,
+            rule_name=rule['name'],
+            reason=rule.get('description', ''),
+            size=size,
+            uploaded=uploaded,
+            ratio=ratio,
+            time_str=datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+        )
+        self._remove_records.append(record)
+        
+        self._total_removed += 1
+        self._total_freed += size
+        
+        # 日志和通知共用的片段只计算一次
+        short_name = torrent_name[:30]
+        size_str = self._fmt_size(size)
+        rule_name = rule['name']
+        
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(f"[{inst_name}] 删除: {short_name} | 规则: {rule_name}")
+        self._log_db('INFO', f"删除 [{short_name}] 规则:{rule_name} 大小:{size_str}")
+        
+        if self.notifier:
+            try:
+                self.notifier.notify(
+                    title="🗑️ 自动删种",
+                    message=f"📦 {torrent_name[:40]}\n📏 {size_str}\n📊 分享率: {ratio:.2f}\n📋 规则: {rule_name}"
+                )
+            except:
+                pass
     
     def _fmt_size(self, b: int) -> str:
-        for u in ['B', 'KiB', 'MiB', 'GiB', 'TiB']:
-            if abs(b) < 1024:
-                return f"{b:.2f} {u}"
-            b /= 1024
-        return f"{b:.2f} PiB"
+        # bit_length直接得到1024的幂次，无需循环除法
+        idx = min(max(0, (abs(int(b)).bit_length() - 1) // 10), len(SIZE_UNITS) - 1)
+        return f"{b / (1 << (10 * idx)):.2f} {SIZE_UNITS[idx]}"
     
     def manual_check(self) -> Dict:
         if not self._running:
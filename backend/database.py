@@ -101,6 +101,12 @@ class Database:
     def __init__(self, db_path: str = 'qbit_smart.db'):
         self.db_path = db_path
         self._local = threading.local()
+        # 数据版本号: 每次写入对应表时递增，供调用方判断缓存是否失效
+        self._config_version = 0
+        self._remove_rules_version = 0
+        self._qb_instances_version = 0
+        self._pt_sites_version = 0
+        self._speed_rules_version = 0
         self._init_db()
         self._init_builtin_rules()
     
@@ -313,6 +319,7 @@ class Database:
                 ''', (rule['name'], rule['description'], rule['condition'], rule['priority']))
             
             conn.commit()
+        self._remove_rules_version += 1
     
     # ════════════════════════════════════════════════════════════════════
     # 配置管理
@@ -333,6 +340,37 @@ class Database:
                 INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)
             ''', (key, value))
             conn.commit()
+        self._config_version += 1
+    
+    def get_configs(self, keys: List[str]) -> Dict[str, str]:
+        """一次查询获取多个配置（不存在的键不会出现在结果中）"""
+        if not keys:
+            return {}
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(keys))
+            cursor.execute(f'SELECT key, value FROM config WHERE key IN ({placeholders})', list(keys))
+            return {row['key']: row['value'] for row in cursor.fetchall()}
+    
+    def get_config_version(self) -> int:
+        """获取配置版本号，配置未变化时版本号不变"""
+        return self._config_version
+    
+    def get_remove_rules_version(self) -> int:
+        """获取删种规则版本号，规则未变化时版本号不变"""
+        return self._remove_rules_version
+    
+    def get_qb_instances_version(self) -> int:
+        """获取qB实例配置版本号，实例未变化时版本号不变"""
+        return self._qb_instances_version
+    
+    def get_pt_sites_version(self) -> int:
+        """获取PT站点版本号，站点未变化时版本号不变"""
+        return self._pt_sites_version
+    
+    def get_speed_rules_version(self) -> int:
+        """获取限速规则版本号，规则未变化时版本号不变"""
+        return self._speed_rules_version
     
     def get_all_config(self) -> Dict[str, str]:
         """获取所有配置"""
@@ -369,6 +407,7 @@ class Database:
                 VALUES (?, ?, ?, ?, ?)
             ''', (name, host, port, username, password))
             conn.commit()
+            self._qb_instances_version += 1
             return cursor.lastrowid
     
     def update_qb_instance(self, instance_id: int, **kwargs):
@@ -381,6 +420,7 @@ class Database:
             values = list(kwargs.values()) + [instance_id]
             cursor.execute(f'UPDATE qb_instances SET {fields} WHERE id = ?', values)
             conn.commit()
+        self._qb_instances_version += 1
     
     def delete_qb_instance(self, instance_id: int):
         """删除qB实例"""
@@ -388,6 +428,7 @@ class Database:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM qb_instances WHERE id = ?', (instance_id,))
             conn.commit()
+        self._qb_instances_version += 1
     
     # ════════════════════════════════════════════════════════════════════
     # PT站点管理
@@ -486,6 +527,7 @@ class Database:
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (name, url, cookie, rss_url, tracker_keyword, preferred_instance_id))
             conn.commit()
+            self._pt_sites_version += 1
             return cursor.lastrowid
     
     def update_pt_site(self, site_id: int, **kwargs):
@@ -510,6 +552,7 @@ class Database:
             values = list(kwargs.values()) + [site_id]
             cursor.execute(f'UPDATE pt_sites SET {fields} WHERE id = ?', values)
             conn.commit()
+        self._pt_sites_version += 1
     
     def delete_pt_site(self, site_id: int):
         """删除PT站点"""
@@ -519,6 +562,8 @@ class Database:
             cursor.execute('DELETE FROM speed_rules WHERE site_id = ?', (site_id,))
             cursor.execute('DELETE FROM rss_rules WHERE site_id = ?', (site_id,))
             conn.commit()
+        self._pt_sites_version += 1
+        self._speed_rules_version += 1
     
     # ════════════════════════════════════════════════════════════════════
     # 限速规则管理
@@ -566,6 +611,7 @@ class Database:
                 VALUES (?, ?, ?, ?)
             ''', (name, site_id, target_speed_kib, safety_margin))
             conn.commit()
+            self._speed_rules_version += 1
             return cursor.lastrowid
     
     def update_speed_rule(self, rule_id: int, **kwargs):
@@ -578,6 +624,7 @@ class Database:
             values = list(kwargs.values()) + [rule_id]
             cursor.execute(f'UPDATE speed_rules SET {fields} WHERE id = ?', values)
             conn.commit()
+        self._speed_rules_version += 1
     
     def delete_speed_rule(self, rule_id: int):
         """删除限速规则"""
@@ -585,6 +632,7 @@ class Database:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM speed_rules WHERE id = ?', (rule_id,))
             conn.commit()
+        self._speed_rules_version += 1
     
     # ════════════════════════════════════════════════════════════════════
     # RSS规则管理
@@ -660,6 +708,7 @@ class Database:
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (name, description, condition, priority, int(enabled), int(builtin)))
             conn.commit()
+            self._remove_rules_version += 1
             return cursor.lastrowid
     
     def update_remove_rule(self, rule_id: int, **kwargs):
@@ -674,6 +723,7 @@ class Database:
             values = list(kwargs.values()) + [rule_id]
             cursor.execute(f'UPDATE remove_rules SET {fields} WHERE id = ?', values)
             conn.commit()
+        self._remove_rules_version += 1
     
     def delete_remove_rule(self, rule_id: int):
         """删除删种规则（内置规则不可删除）"""
@@ -681,6 +731,7 @@ class Database:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM remove_rules WHERE id = ? AND builtin = 0', (rule_id,))
             conn.commit()
+        self._remove_rules_version += 1
     
     def reset_builtin_rules(self):
         """重置内置删种规则"""
@@ -702,6 +753,23 @@ class Database:
             ''', (level, message))
             conn.commit()
     
+    def add_logs(self, records: List[tuple]):
+        """
+        批量添加日志，一次executemany、一次提交
+        
+        records 为 (level, message, timestamp) 列表；created_at 按UTC写入，与 CURRENT_TIMESTAMP 格式一致
+        """
+        if not records:
+            return
+        rows = [(level, message, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)))
+                for level, message, ts in records]
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO logs (level, message, created_at) VALUES (?, ?, ?)
+            ''', rows)
+            conn.commit()
+    
     def get_logs(self, limit: int = 100, level: str = None) -> List[Dict]:
         """获取日志"""
         with self.get_conn() as conn:
@@ -801,33 +869,51 @@ class Database:
     # ════════════════════════════════════════════════════════════════════
     # 种子限速状态持久化
     # ════════════════════════════════════════════════════════════════════
+    _LIMIT_STATE_INSERT = '''
+        INSERT OR REPLACE INTO torrent_limit_states 
+        (hash, name, tracker, instance_id, site_id, tid, cycle_index, cycle_start,
+         cycle_uploaded_start, cycle_synced, target_speed, last_limit, 
+         reannounce_time, cached_time_left, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    @staticmethod
+    def _limit_state_row(state: Dict, updated_at: float) -> tuple:
+        """把状态字典转为 torrent_limit_states 的一行"""
+        return (
+            state.get('hash'),
+            state.get('name', ''),
+            state.get('tracker', ''),
+            state.get('instance_id', 0),
+            state.get('site_id'),
+            state.get('tid'),
+            state.get('cycle_index', 0),
+            state.get('cycle_start', 0),
+            state.get('cycle_uploaded_start', 0),
+            1 if state.get('cycle_synced') else 0,
+            state.get('target_speed', 0),
+            state.get('last_limit', -1),
+            state.get('reannounce_time', 0),
+            state.get('cached_time_left', 1800),
+            updated_at
+        )
+    
     def save_torrent_limit_state(self, state: Dict):
         """保存种子限速状态"""
         with self.get_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO torrent_limit_states 
-                (hash, name, tracker, instance_id, site_id, tid, cycle_index, cycle_start,
-                 cycle_uploaded_start, cycle_synced, target_speed, last_limit, 
-                 reannounce_time, cached_time_left, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                state.get('hash'),
-                state.get('name', ''),
-                state.get('tracker', ''),
-                state.get('instance_id', 0),
-                state.get('site_id'),
-                state.get('tid'),
-                state.get('cycle_index', 0),
-                state.get('cycle_start', 0),
-                state.get('cycle_uploaded_start', 0),
-                1 if state.get('cycle_synced') else 0,
-                state.get('target_speed', 0),
-                state.get('last_limit', -1),
-                state.get('reannounce_time', 0),
-                state.get('cached_time_left', 1800),
-                time.time()
-            ))
+            cursor.execute(self._LIMIT_STATE_INSERT, self._limit_state_row(state, time.time()))
+            conn.commit()
+    
+    def save_torrent_limit_states(self, states: List[Dict]):
+        """批量保存种子限速状态，一次executemany、一次提交"""
+        if not states:
+            return
+        now = time.time()
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(self._LIMIT_STATE_INSERT,
+                               [self._limit_state_row(state, now) for state in states])
             conn.commit()
     
     def load_torrent_limit_state(self, torrent_hash: str) -> Optional[Dict]:
@@ -4,57 +4,165 @@
 """
 
 import threading
-import queue
 import time
 import logging
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, Tuple, List
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
     REQUESTS_AVAILABLE = True
 except ImportError:
     REQUESTS_AVAILABLE = False
 
 
+# Telegram MarkdownV2 需要转义的字符
+_MD_ESCAPE_TABLE = str.maketrans({c: '\\' + c for c in '\\_*[]()~`>#+-=|{}.!'})
+
+
+def _escape_md(text: str) -> str:
+    """转义MarkdownV2特殊字符"""
+    return text.translate(_MD_ESCAPE_TABLE)
+
+
+def _format_text(title: str, body: str) -> str:
+    """组装消息文本，title和body须已转义"""
+    return f"*{title}*\n{body}" if title else body
+
+
 class Notifier:
     """通知管理器"""
     
+    COALESCE_WINDOW = 5        # 合并同标题通知的时间窗口（秒）
+    MAX_MESSAGE_CHARS = 3000   # 合并后单条消息的长度上限（Telegram限制4096）
+    COALESCE_SEPARATOR = _escape_md("\n---\n")
+    PACK_SEPARATOR = "\n\n"
+    MAX_RETRY_AFTER = 60       # 被Telegram限流时最多等待的秒数
+    
     def __init__(self, db=None):
         self.db = db
-        self._queue = queue.Queue()
-        self._thread: Optional[threading.Thread] = None
         self._running = False
         self.logger = logging.getLogger("notifier")
+        
+        # 待发送通知，由线程池中的一次flush任务统一合并发送
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_lock = threading.Lock()
+        self._flush_future: Optional[Future] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stop_event = threading.Event()
+        
+        # Telegram配置缓存: (配置版本, bot_token, chat_id, proxy)
+        self._config_cache: Optional[Tuple[int, str, str, str]] = None
+        
+        # 复用连接，避免每条通知都重新建立TCP+TLS
+        self._session = None
+        self._proxy = ''
+        self._proxies: Dict[str, str] = {}
+        if REQUESTS_AVAILABLE:
+            self._session = requests.Session()
+            self._session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
     
     def start(self):
-        """启动通知线程"""
+        """启动通知发送（启动前入队的通知会在此时开始发送）"""
         if self._running:
             return
         self._running = True
-        self._thread = threading.Thread(target=self._run, daemon=True)
-        self._thread.start()
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Notifier")
+        with self._pending_lock:
+            if self._pending:
+                self._schedule_flush()
     
     def stop(self):
-        """停止通知线程"""
+        """停止通知发送，尽量发出已入队的通知"""
         self._running = False
-        if self._thread:
-            self._queue.put(None)  # 发送退出信号
-            self._thread.join(timeout=5)
-    
-    def _run(self):
-        """通知发送线程"""
-        while self._running:
+        self._stop_event.set()  # 结束合并等待，立即发送
+        future = self._flush_future
+        if future:
             try:
-                item = self._queue.get(timeout=1)
-                if item is None:
-                    break
-                
-                self._send(item)
-                
-            except queue.Empty:
-                continue
-            except Exception as e:
-                self.logger.error(f"通知发送失败: {e}")
+                future.result(timeout=5)
+            except Exception:
+                pass
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._session:
+            self._session.close()
+    
+    def _schedule_flush(self):
+        """提交一次flush任务，调用方须持有 _pending_lock"""
+        if self._flush_future is None and self._executor:
+            self._flush_future = self._executor.submit(self._flush)
+    
+    def _flush(self):
+        """等待合并窗口后取出全部待发送通知并发送"""
+        self._stop_event.wait(self.COALESCE_WINDOW)
+        
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+            self._flush_future = None
+        
+        try:
+            for notification in self._pack(self._coalesce(batch)):
+                self._send(notification)
+        except Exception as e:
+            self.logger.error(f"通知发送失败: {e}")
+    
+    def _coalesce(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按标题合并通知，单条合并消息超过长度上限时拆分"""
+        groups: Dict[str, List[Tuple[List[Dict[str, Any]], int]]] = {}  # title -> [(通知列表, 总长度)]
+        for item in batch:
+            message = item['_message']
+            chunks = groups.setdefault(item.get('title', ''), [([], 0)])
+            items, size = chunks[-1]
+            if items and size + len(message) > self.MAX_MESSAGE_CHARS:
+                items, size = [], 0
+                chunks.append((items, size))
+            items.append(item)
+            chunks[-1] = (items, size + len(message) + len(self.COALESCE_SEPARATOR))
+        
+        result = []
+        for title, chunks in groups.items():
+            for items, _ in chunks:
+                if len(items) == 1:
+                    result.append(items[0])  # 单条通知直接使用入队时生成的文本
+                    continue
+                body = self.COALESCE_SEPARATOR.join(item['_message'] for item in items)
+                result.append({
+                    'title': title,
+                    '_text': _format_text(items[0]['_title'], body),
+                })
+        return result
+    
+    def _pack(self, notifications: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把不同标题的通知拼进尽量少的消息里（Bot API没有批量发送接口）"""
+        packed = []
+        texts: List[str] = []
+        size = 0
+        for notification in notifications:
+            text = notification['_text']
+            if texts and size + len(text) > self.MAX_MESSAGE_CHARS:
+                packed.append({'_text': self.PACK_SEPARATOR.join(texts)})
+                texts, size = [], 0
+            texts.append(text)
+            size += len(text) + len(self.PACK_SEPARATOR)
+        if texts:
+            packed.append({'_text': self.PACK_SEPARATOR.join(texts)})
+        return packed
+    
+    def _get_telegram_config(self) -> Tuple[str, str, str]:
+        """获取 (bot_token, chat_id, proxy)，配置版本不变时直接使用缓存"""
+        version = self.db.get_config_version()
+        if self._config_cache is None or self._config_cache[0] != version:
+            config = self.db.get_configs(['telegram_bot_token', 'telegram_chat_id', 'global_proxy'])
+            self._config_cache = (
+                version,
+                config.get('telegram_bot_token') or '',
+                config.get('telegram_chat_id') or '',
+                config.get('global_proxy') or '',
+            )
+        return self._config_cache[1:]
     
     def _send(self, notification: Dict[str, Any]):
         """发送通知"""
@@ -63,34 +171,42 @@ class Notifier:
         
         # 获取Telegram配置
         if self.db:
-            bot_token = self.db.get_config('telegram_bot_token', '')
-            chat_id = self.db.get_config('telegram_chat_id', '')
+            bot_token, chat_id, proxy = self._get_telegram_config()
         else:
             return
         
         if not bot_token or not chat_id:
             return
         
-        title = notification.get('title', '')
-        message = notification.get('message', '')
-        text = f"*{title}*\n{message}" if title else message
+        text = notification.get('_text')
+        if text is None:
+            text = _format_text(_escape_md(notification.get('title', '')),
+                                _escape_md(notification.get('message', '')))
         
         try:
             url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
             payload = {
                 'chat_id': chat_id,
                 'text': text,
-                'parse_mode': 'Markdown'
+                'parse_mode': 'MarkdownV2'
             }
             
-            # 使用代理（如果配置了）
-            proxies = {}
-            if self.db:
-                proxy = self.db.get_config('global_proxy', '')
-                if proxy:
-                    proxies = {'http': proxy, 'https': proxy}
+            # 使用代理（如果配置了），仅在代理变化时重建；
+            # 按请求传入，优先级高于环境变量中的代理（会话级proxies会被环境变量覆盖）
+            if proxy != self._proxy:
+                self._proxies = {'http': proxy, 'https': proxy} if proxy else {}
+                self._proxy = proxy
+            
+            response = self._session.post(url, json=payload, proxies=self._proxies, timeout=10)
             
-            response = requests.post(url, json=payload, proxies=proxies, timeout=10)
+            # 被限流时按Telegram给出的retry_after等待后重试一次
+            if response.status_code == 429:
+                try:
+                    retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+                except ValueError:
+                    retry_after = 1
+                time.sleep(min(retry_after, self.MAX_RETRY_AFTER))
+                response = self._session.post(url, json=payload, proxies=self._proxies, timeout=10)
             
             if response.status_code != 200:
                 self.logger.warning(f"Telegram通知失败: {response.text}")
@@ -99,12 +215,20 @@ class Notifier:
             self.logger.error(f"发送Telegram通知失败: {e}")
     
     def notify(self, title: str = '', message: str = '', **kwargs):
-        """添加通知到队列"""
-        self._queue.put({
-            'title': title,
-            'message': message,
-            **kwargs
-        })
+        """添加通知到队列（转义和文本组装在入队时完成，发送线程只负责网络请求）"""
+        escaped_title = _escape_md(title)
+        escaped_message = _escape_md(message)
+        with self._pending_lock:
+            self._pending.append({
+                'title': title,
+                'message': message,
+                **kwargs,
+                '_title': escaped_title,
+                '_message': escaped_message,
+                '_text': _format_text(escaped_title, escaped_message),
+            })
+            if self._running:
+                self._schedule_flush()
     
     def notify_startup(self):
         """发送启动通知"""
@@ -8,13 +8,22 @@
 - 改进日志和状态显示
 """
 
+import sys
 import time
 import threading
 import logging
 from urllib.parse import urlparse
-from dataclasses import dataclass, field
+from functools import lru_cache
+from dataclasses import dataclass, field, fields, MISSING
 from typing import Dict, Optional, List, Any, Tuple
-from collections import deque
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
 
 try:
     from pt_site_helper import PTSiteHelperManager, create_helper_manager
@@ -52,15 +61,8 @@ class LimitConfig:
 # 工具函数
 # ════════════════════════════════════════════════════════════════════════════════
 def safe_div(a: float, b: float, default: float = 0) -> float:
-    try:
-        if b == 0 or abs(b) < 1e-10:
-            return default
-        return a / b
-    except:
-        return default
-
-def clamp(value: float, min_val: float, max_val: float) -> float:
-    return max(min_val, min(max_val, value))
+    # 纯分支判断，不用异常做流程控制
+    return a / b if b > 1e-10 or b < -1e-10 else default
 
 def fmt_speed(b: float) -> str:
     if b == 0:
@@ -80,6 +82,11 @@ def fmt_size(b: float) -> str:
         b /= 1024
     return f"{b:.2f} PiB"
 
+@lru_cache(maxsize=4096)
+def _url_host(url: str) -> str:
+    """提取URL的小写主机名，同一URL只解析一次"""
+    return (urlparse(url).hostname or '').lower() if url else ''
+
 def get_phase(time_left: float, cycle_synced: bool) -> str:
     if not cycle_synced:
         return 'warmup'
@@ -90,37 +97,126 @@ def get_phase(time_left: float, cycle_synced: bool) -> str:
     return 'catch'
 
 
+# 阶段编码，供纯数值的限速计算使用
+PHASE_WARMUP, PHASE_CATCH, PHASE_STEADY, PHASE_FINISH = 0, 1, 2, 3
+PHASE_CODES = {'warmup': PHASE_WARMUP, 'catch': PHASE_CATCH, 'steady': PHASE_STEADY, 'finish': PHASE_FINISH}
+PHASE_NAMES = ('warmup', 'catch', 'steady', 'finish')
+
+# 各阶段PID参数，下标为阶段编码: (名称, kp, ki, kd, headroom)；导入时从 LimitConfig 展开一次
+PHASE_PARAMS = tuple(
+    (name,) + tuple(LimitConfig.PID_PARAMS[name][k] for k in ('kp', 'ki', 'kd', 'headroom'))
+    for name in PHASE_NAMES
+)
+
+# 汇报时间来源和阶段的显示标记
+_SRC_TAG = {"site": "🌐", "qb_api": "📡", "estimated": "⏱", "cached": "💾"}
+_PHASE_EMOJI = {'warmup': '🔥', 'catch': '🏃', 'steady': '⚖️', 'finish': '🎯'}
+
+# 限速原因模板，下标为 _calc_limit_core 返回的原因编码
+_REASON_FORMATS = (
+    "F:{k}K", "S:{k}K", "C:欠速", "C:{k}K",
+    "W:超{p}%", "W:精控", "W:温控", "W:预热",
+)
+
+def _calc_limit_core(phase_code: int, target_speed: float, target_total: float,
+                     cycle_uploaded: float, time_left: float, pid_output: float,
+                     headroom: float, predicted_upload: float) -> Tuple[int, int, float, float]:
+    """
+    限速计算的纯数值部分，只接受和返回数值，不做字符串处理
+    
+    time_left 须大于0。返回 (限速, 原因编码, 所需速度, 进度)
+    """
+    need_upload = target_total - cycle_uploaded
+    if need_upload < 0:
+        need_upload = 0
+    required_speed = need_upload / time_left
+    # 以下除法内联 safe_div 的判断，省去函数调用
+    valid_total = target_total > 1e-10 or target_total < -1e-10
+    progress = cycle_uploaded / target_total if valid_total else 0
+    
+    if phase_code == PHASE_FINISH:
+        predicted_ratio = (cycle_uploaded + predicted_upload) / target_total if valid_total else 0
+        if predicted_ratio > 1.002:
+            correction = max(0.8, 1 - (predicted_ratio - 1) * 3)
+        elif predicted_ratio < 0.998:
+            correction = min(1.2, 1 + (1 - predicted_ratio) * 3)
+        else:
+            correction = 1.0
+        limit = int(required_speed * pid_output * correction)
+        reason_code = 0
+    elif phase_code == PHASE_STEADY:
+        limit = int(required_speed * headroom * pid_output)
+        reason_code = 1
+    elif phase_code == PHASE_CATCH:
+        if required_speed > target_speed * 5:
+            limit = -1
+            reason_code = 2
+        else:
+            limit = int(required_speed * headroom * pid_output)
+            reason_code = 3
+    else:
+        if progress >= 1.0:
+            limit = LimitConfig.MIN_LIMIT
+            reason_code = 4
+        elif progress >= 0.8:
+            limit = int(required_speed * 1.01 * pid_output)
+            reason_code = 5
+        elif progress >= 0.5:
+            limit = int(required_speed * 1.05)
+            reason_code = 6
+        else:
+            limit = -1
+            reason_code = 7
+    
+    if limit > 0:
+        limit = max(LimitConfig.MIN_LIMIT, min(LimitConfig.MAX_LIMIT, limit))
+        step = 1024 if phase_code == PHASE_FINISH else 4096
+        limit = int((limit + step // 2) // step) * step
+    
+    return limit, reason_code, required_speed, progress
+
+
 # ════════════════════════════════════════════════════════════════════════════════
 # PID控制器
 # ════════════════════════════════════════════════════════════════════════════════
 class PIDController:
+    __slots__ = ('integral', 'last_error', 'last_time', 'phase_idx')
+    
     def __init__(self):
         self.integral = 0
         self.last_error = 0
         self.last_time = 0
-        self.phase = 'warmup'
+        self.phase_idx = PHASE_WARMUP
     
-    def set_phase(self, phase: str):
-        if phase != self.phase:
+    @property
+    def phase(self) -> str:
+        return PHASE_NAMES[self.phase_idx]
+    
+    def set_phase(self, phase_idx: int):
+        if phase_idx != self.phase_idx:
             self.integral *= 0.5
-            self.phase = phase
+            self.phase_idx = phase_idx
     
     def update(self, target: float, actual: float, now: float) -> float:
-        params = LimitConfig.PID_PARAMS.get(self.phase, LimitConfig.PID_PARAMS['catch'])
-        kp, ki, kd = params['kp'], params['ki'], params['kd']
+        # 每个种子每轮都会调用：状态读入局部变量、内联clamp，减少属性访问和函数调用
+        _, kp, ki, kd, _ = PHASE_PARAMS[self.phase_idx]
         
-        error = safe_div(target - actual, max(target, 1), 0)
+        # 分母 max(target, 1) 恒 >= 1，无需 safe_div
+        error = (target - actual) / (target if target > 1 else 1)
         
-        dt = now - self.last_time if self.last_time > 0 else 1
+        last_time = self.last_time
+        dt = now - last_time if last_time > 0 else 1
         self.last_time = now
         
-        self.integral = clamp(self.integral + error * dt, -0.5, 0.5)
+        integral = self.integral + error * dt
+        integral = -0.5 if integral < -0.5 else (0.5 if integral > 0.5 else integral)
+        self.integral = integral
         
         derivative = (error - self.last_error) / dt if dt > 0 else 0
         self.last_error = error
         
-        output = 1.0 + kp * error + ki * self.integral + kd * derivative
-        return clamp(output, 0.3, 3.0)
+        output = 1.0 + kp * error + ki * integral + kd * derivative
+        return 0.3 if output < 0.3 else (3.0 if output > 3.0 else output)
     
     def reset(self):
         self.integral = 0
@@ -132,6 +228,9 @@ class PIDController:
 # Kalman滤波器
 # ════════════════════════════════════════════════════════════════════════════════
 class KalmanFilter:
+    __slots__ = ('speed', 'acceleration', 'p_speed', 'p_accel', 'last_time',
+                 'q_speed', 'q_accel', 'r')
+    
     def __init__(self):
         self.speed = 0
         self.acceleration = 0
@@ -144,26 +243,30 @@ class KalmanFilter:
         self.r = 0.5
     
     def update(self, measured_speed: float, now: float):
-        if self.last_time <= 0:
+        last_time = self.last_time
+        if last_time <= 0:
             self.speed = measured_speed
             self.last_time = now
             return
         
-        dt = now - self.last_time
+        dt = now - last_time
         if dt <= 0:
             return
         self.last_time = now
         
-        predicted_speed = self.speed + self.acceleration * dt
-        self.p_speed += self.q_speed + self.p_accel * dt * dt
-        self.p_accel += self.q_accel
+        # 状态读入局部变量计算，最后一次性写回
+        acceleration = self.acceleration
+        p_accel = self.p_accel
+        predicted_speed = self.speed + acceleration * dt
+        p_speed = self.p_speed + (self.q_speed + p_accel * dt * dt)
+        self.p_accel = p_accel + self.q_accel
         
         innovation = measured_speed - predicted_speed
-        k = self.p_speed / (self.p_speed + self.r)
+        k = p_speed / (p_speed + self.r)
         
         self.speed = predicted_speed + k * innovation
-        self.acceleration += 0.1 * innovation / dt
-        self.p_speed *= (1 - k)
+        self.acceleration = acceleration + 0.1 * innovation / dt
+        self.p_speed = p_speed * (1 - k)
     
     def predict_upload(self, time_left: float) -> float:
         return self.speed * time_left + 0.5 * self.acceleration * time_left * time_left
@@ -179,7 +282,11 @@ class KalmanFilter:
 # ════════════════════════════════════════════════════════════════════════════════
 # 种子状态
 # ════════════════════════════════════════════════════════════════════════════════
-@dataclass
+# 每个受控种子一个状态对象：用 __slots__ 省掉实例 __dict__（dataclass 的 slots 参数需要 Python 3.10+）
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class TorrentLimitState:
     """单个种子的限速状态"""
     hash: str
@@ -208,6 +315,11 @@ class TorrentLimitState:
     
     last_log_time: float = 0
     
+    # 最近一轮从种子列表采样的数据，供状态查询直接读取
+    last_uploaded: int = 0
+    last_upspeed: float = 0
+    last_sample_ts: float = 0
+    
     def get_phase(self, now: float) -> str:
         if not self.cycle_synced:
             return 'warmup'
@@ -224,6 +336,18 @@ class TorrentLimitState:
         self.pid.reset()
         self.reannounce_time = now + time_left
         self.cached_time_left = time_left
+    
+    def reinit(self, hash: str, **values):
+        """复用对象：字段恢复默认值后再设置 values，PID/Kalman 原地重置而不重新分配"""
+        for f in fields(self):
+            if f.default is not MISSING:
+                setattr(self, f.name, f.default)
+        self.hash = hash
+        self.pid.reset()
+        self.pid.phase_idx = PHASE_WARMUP
+        self.kalman.reset()
+        for name, value in values.items():
+            setattr(self, name, value)
 
 
 # ════════════════════════════════════════════════════════════════════════════════
@@ -234,6 +358,14 @@ class PrecisionLimitEngine:
     
     VERSION = "1.8.0"
     
+    TICK_INTERVAL = 5
+    MAX_WORKERS = 8  # 并发处理的qB实例数上限
+    STATE_EXPIRE = 86400  # 超过该秒数未处理的种子状态被清理，与数据库恢复的过期时间一致
+    STATE_POOL_SIZE = 256  # 状态对象池上限
+    SITE_REANNOUNCE_TTL = 8  # 站点汇报时间的复用秒数
+    LOG_BUFFER_SIZE = 10000  # 待写库日志的缓冲上限
+    SAMPLE_STALE_AFTER = 10  # 采样超过该秒数视为过期
+    
     def __init__(self, db, qb_manager, site_helper_manager=None, notifier=None, logger=None):
         self.db = db
         self.qb_manager = qb_manager
@@ -244,6 +376,9 @@ class PrecisionLimitEngine:
         self._states: Dict[str, TorrentLimitState] = {}
         self._running = False
         self._thread = None
+        self._stop_event = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._log_buffer = deque(maxlen=self.LOG_BUFFER_SIZE)
         self._lock = threading.Lock()
         
         self._stats = {
@@ -253,9 +388,23 @@ class PrecisionLimitEngine:
             'torrents_controlled': 0,
         }
         
+        # 站点与限速规则缓存，按数据库版本号失效
+        self._rules_cache_key = None
+        self._enabled_rules: Dict[Optional[int], dict] = {}
+        self._site_index: List[Tuple[str, str, dict]] = []  # (关键字, 站点域名, 规则)，按站点顺序
+        self._site_automaton = None  # 关键字/域名 -> 在 _site_index 中的最小位置
+        self._rule_by_tracker: Dict[str, Optional[dict]] = {}
+        
+        # 长时间未出现的种子状态会被清理，对象放回池中供新种子复用
+        self._state_pool: List[TorrentLimitState] = []
+        
+        # 站点汇报时间缓存: (site_id, tid) -> (获取时间, 剩余秒数)
+        self._reannounce_cache: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        
         # 状态持久化相关
         self._last_save_time = 0
         self._save_interval = 180  # 每3分钟保存一次
+        self._saved_records: Dict[str, Dict[str, Any]] = {}  # 上次写入数据库的内容，用于跳过未变化的种子
         
         # 尝试从数据库恢复状态
         self._restore_states_from_db()
@@ -265,9 +414,10 @@ class PrecisionLimitEngine:
         try:
             saved_states = self.db.get_all_torrent_limit_states()
             restored = 0
+            now = time.time()
             for data in saved_states:
                 # 检查数据是否过期（超过24小时）
-                if time.time() - data.get('updated_at', 0) > 86400:
+                if now - data.get('updated_at', 0) > 86400:
                     continue
                 
                 state = TorrentLimitState(
@@ -285,6 +435,7 @@ class PrecisionLimitEngine:
                     last_limit=data.get('last_limit', -1),
                     reannounce_time=data.get('reannounce_time', 0),
                     cached_time_left=data.get('cached_time_left', 1800),
+                    last_sample_ts=data.get('updated_at', 0),
                 )
                 self._states[data['hash']] = state
                 restored += 1
@@ -294,70 +445,114 @@ class PrecisionLimitEngine:
         except Exception as e:
             self._log('warning', f"恢复状态失败: {e}")
     
+    @staticmethod
+    def _state_record(state: TorrentLimitState) -> Dict[str, Any]:
+        """需要持久化的状态字段"""
+        return {
+            'hash': state.hash,
+            'name': state.name,
+            'tracker': state.tracker,
+            'instance_id': state.instance_id,
+            'site_id': state.site_id,
+            'tid': state.tid,
+            'cycle_index': state.cycle_index,
+            'cycle_start': state.cycle_start,
+            'cycle_uploaded_start': state.cycle_uploaded_start,
+            'cycle_synced': state.cycle_synced,
+            'target_speed': state.target_speed,
+            'last_limit': state.last_limit,
+            'reannounce_time': state.reannounce_time,
+            'cached_time_left': state.cached_time_left,
+        }
+    
     def _save_states_to_db(self):
-        """保存所有状态到数据库"""
+        """保存状态到数据库，只写入上次保存后有变化的种子"""
         try:
-            for hash, state in self._states.items():
-                self.db.save_torrent_limit_state({
-                    'hash': state.hash,
-                    'name': state.name,
-                    'tracker': state.tracker,
-                    'instance_id': state.instance_id,
-                    'site_id': state.site_id,
-                    'tid': state.tid,
-                    'cycle_index': state.cycle_index,
-                    'cycle_start': state.cycle_start,
-                    'cycle_uploaded_start': state.cycle_uploaded_start,
-                    'cycle_synced': state.cycle_synced,
-                    'target_speed': state.target_speed,
-                    'last_limit': state.last_limit,
-                    'reannounce_time': state.reannounce_time,
-                    'cached_time_left': state.cached_time_left,
-                })
+            with self._lock:
+                states = list(self._states.values())
+            
+            changed = []
+            for state in states:
+                record = self._state_record(state)
+                if self._saved_records.get(state.hash) != record:
+                    changed.append(record)
+            
+            self.db.save_torrent_limit_states(changed)
+            for record in changed:
+                self._saved_records[record['hash']] = record
             self._last_save_time = time.time()
         except Exception as e:
             self._log('warning', f"保存状态失败: {e}")
     
     def _log(self, level: str, message: str):
         level_name = level.lower()
+        if level_name == 'debug' and not self.logger.isEnabledFor(logging.DEBUG):
+            return
         getattr(self.logger, level_name, self.logger.info)(f"[LimitEngine] {message}")
         if level_name in {"info", "warning", "error"}:
-            try:
-                self.db.add_log(level_name.upper(), f"[LimitEngine] {message}")
-            except Exception:
-                pass
+            # 写库放到每轮结束后批量进行，缓冲满时丢弃最旧的记录
+            self._log_buffer.append((level_name.upper(), f"[LimitEngine] {message}", time.time()))
+    
+    def _flush_logs(self):
+        """把缓冲的日志批量写入数据库"""
+        buffer = self._log_buffer
+        records = []
+        try:
+            while True:
+                records.append(buffer.popleft())
+        except IndexError:
+            pass
+        if not records:
+            return
+        try:
+            self.db.add_logs(records)
+        except Exception:
+            pass
     
     def start(self):
         if self._running:
             return
         self._running = True
-        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        # 每次启动使用新的事件，避免尚未退出的旧线程被clear()复活
+        self._stop_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="LimitWorker")
+        self._thread = threading.Thread(target=self._run_loop, args=(self._stop_event,), daemon=True)
         self._thread.start()
         self._log('info', f"精准限速引擎 v{self.VERSION} 已启动")
     
     def stop(self):
         self._running = False
+        self._stop_event.set()
         # 停止前保存状态
         self._save_states_to_db()
         if self._thread:
             self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         self._log('info', "精准限速引擎已停止")
+        self._flush_logs()
     
     def is_running(self) -> bool:
         return self._running
     
-    def _run_loop(self):
-        while self._running:
+    def _run_loop(self, stop_event: threading.Event):
+        while not stop_event.is_set():
+            tick_start = time.monotonic()
             try:
-                self._process_all()
+                now = time.time()
+                self._process_all(now, tick_start)
                 
                 # 定期保存状态
-                if time.time() - self._last_save_time > self._save_interval:
+                if now - self._last_save_time > self._save_interval:
+                    self._prune_states(now)
                     self._save_states_to_db()
                     
             except Exception as e:
                 self._log('error', f"处理异常: {e}")
-            time.sleep(5)
+            self._flush_logs()
+            # 扣除本轮耗时，保持固定的节拍
+            stop_event.wait(max(0, self.TICK_INTERVAL - (time.monotonic() - tick_start)))
 
     def _should_limit_torrent(self, torrent: dict) -> bool:
         state = (torrent.get('state') or '').lower()
@@ -369,14 +564,139 @@ class PrecisionLimitEngine:
             return True
         return state.endswith('up')
     
-    def _process_all(self):
-        """处理所有活动种子"""
-        now = time.time()
+    def _process_all(self, now: float = None, mono: float = None):
+        """
+        处理所有活动种子
+        
+        now 为墙上时间，用于需要持久化的绝对时刻（周期开始、汇报时间）；
+        mono 为单调时间，用于PID/Kalman的时间差，不受系统校时影响。每轮只取一次。
+        """
+        if now is None:
+            now = time.time()
+        if mono is None:
+            mono = time.monotonic()
+        
+        if not self._refresh_rules():
+            return
+        
+        if not self._enabled_rules:
+            self._log('warning', "未找到启用的限速规则")
+            return
+        
+        # 处理每个qB实例
+        instances = self.db.get_qb_instances()
+        
+        if not instances:
+            self._log('warning', "未找到qB实例配置")
+            return
+        
+        instances = [i for i in instances if i['enabled']]
+        
+        # 分两个阶段：先并发获取数据并计算限速，再并发下发限速变化。
+        # 慢实例只拖慢自己，计算阶段也不会夹杂写请求
+        results = self._run_parallel(self._process_instance,
+                                     [(i, now, mono) for i in instances], "处理实例异常")
+        self._stats['torrents_controlled'] = sum(count for count, _ in results)
+        
+        changes = [(i['id'], c) for i, (_, c) in zip(instances, results) if c]
+        self._run_parallel(self._apply_limits, changes, "应用限速异常")
+    
+    def _run_parallel(self, func, args_list: List[tuple], error_msg: str) -> List[Any]:
+        """
+        在线程池中并发执行 func(*args)，按顺序返回结果
+        
+        只有一项或线程池未启动时直接在当前线程执行；执行失败的项记日志并返回 (0, [])。
+        """
+        executor = self._executor
+        if executor and len(args_list) > 1:
+            futures = [executor.submit(func, *args) for args in args_list]
+        else:
+            futures = None
+        
+        results = []
+        for idx, args in enumerate(args_list):
+            try:
+                results.append(futures[idx].result() if futures else func(*args))
+            except Exception as e:
+                self._log('error', f"{error_msg}: {e}")
+                results.append((0, []))
+        return results
+    
+    def _process_instance(self, instance: dict, now: float,
+                          mono: float) -> Tuple[int, List[Tuple[TorrentLimitState, int, str]]]:
+        """计算单个qB实例活动种子的限速，返回 (受控种子数, 需要下发的限速变化)"""
+        inst_id = instance['id']
+        client = self.qb_manager.get_client(inst_id)
+        if not client:
+            return 0, []
+        
+        try:
+            # 增量同步：每轮只传输和解析变化的字段
+            torrents = self.qb_manager.get_torrents_synced(inst_id)
+        except Exception as e:
+            self._log('warning', f"获取种子列表失败: {e}")
+            return 0, []
+        
+        if not torrents:
+            self._log('info', f"实例{inst_id}未返回任何种子")
+            return 0, []
+        
+        work = []
+        for torrent in torrents:
+            if not self._should_limit_torrent(torrent):
+                continue
+            rule = self._find_rule(torrent)
+            if rule:
+                work.append((torrent, rule))
+            else:
+                self._log('info', f"未匹配到规则: {torrent.get('name', '')[:30]}")
+        
+        changes = []
+        for torrent, rule in work:
+            change = self._process_torrent(inst_id, client, torrent, rule, now, mono)
+            if change:
+                changes.append(change)
+        return len(work), changes
+    
+    def _apply_limits(self, instance_id: int, changes: List[Tuple[TorrentLimitState, int, str]]):
+        """
+        下发限速变化，成功后才记录为当前限速
+        
+        限速值经过取整，多个种子常落在同一个值上：按限速值分组，每组一次批量请求。
+        """
+        by_limit: Dict[int, List[Tuple[TorrentLimitState, str]]] = defaultdict(list)
+        for state, new_limit, reason in changes:
+            by_limit[new_limit].append((state, reason))
+        
+        for new_limit, group in by_limit.items():
+            try:
+                ok, msg = self.qb_manager.set_upload_limit(
+                    instance_id, [state.hash for state, _ in group], new_limit)
+            except Exception as e:
+                ok, msg = False, str(e)
+            if not ok:
+                self._log('debug', f"设置限速失败: {msg}")
+                continue
+            for state, reason in group:
+                state.last_limit = new_limit
+                state.last_limit_reason = reason
+    
+    def _refresh_rules(self) -> bool:
+        """站点、限速规则或代理配置变化时重新加载并重建tracker索引，失败返回False"""
+        cache_key = (self.db.get_pt_sites_version(), self.db.get_speed_rules_version(),
+                     self.db.get_config_version())
+        if cache_key == self._rules_cache_key:
+            return True
+        
+        try:
+            sites = self.db.get_pt_sites()
+        except Exception as e:
+            self._log('debug', f"获取站点失败: {e}")
+            return False
         
         # 更新站点辅助器配置
         if self.site_helper_manager and PT_HELPER_AVAILABLE:
             try:
-                sites = self.db.get_pt_sites()
                 proxy = self.db.get_config('global_proxy') or ''
                 self.site_helper_manager.update_from_db(sites, proxy)
             except Exception as e:
@@ -388,116 +708,144 @@ class PrecisionLimitEngine:
             rules = self.db.get_speed_rules()
             for rule in rules:
                 if rule.get('enabled'):
+                    # 目标速度 (KiB/s -> B/s) 只在规则加载时计算一次
+                    target_kib = rule.get('target_speed_kib', 51200)
+                    safety = rule.get('safety_margin', 0.98)
+                    rule['_target_speed'] = int(target_kib * 1024 * safety)
                     site_id = rule.get('site_id')
                     enabled_rules[site_id] = rule
         except Exception as e:
             self._log('debug', f"获取限速规则失败: {e}")
-            return
-        
-        if not enabled_rules:
-            self._log('warning', "未找到启用的限速规则")
-            return
-        
-        # 处理每个qB实例
-        instances = self.db.get_qb_instances()
-        controlled_count = 0
+            return False
         
-        if not instances:
-            self._log('warning', "未找到qB实例配置")
-            return
-
-        for instance in instances:
-            if not instance['enabled']:
-                continue
-            
-            inst_id = instance['id']
-            client = self.qb_manager.get_client(inst_id)
-            if not client:
-                continue
-            
-            try:
-                torrents = self.qb_manager.get_torrents(inst_id)
-            except Exception as e:
-                self._log('warning', f"获取种子列表失败: {e}")
-                continue
-            
-            if not torrents:
-                self._log('info', f"实例{inst_id}未返回任何种子")
+        # 关键字和域名只在规则变化时小写/解析一次
+        site_index = []
+        for site in sites:
+            rule = enabled_rules.get(site.get('id'))
+            if rule is None:
                 continue
-            
-            for torrent in torrents:
-                if not self._should_limit_torrent(torrent):
-                    continue
-                rule = self._find_rule(torrent, enabled_rules)
-                if rule:
-                    self._process_torrent(inst_id, client, torrent, rule, now)
-                    controlled_count += 1
-                else:
-                    self._log('info', f"未匹配到规则: {torrent.get('name', '')[:30]}")
+            keyword = (site.get('tracker_keyword', '') or '').lower()
+            site_host = _url_host(site.get('url') or '')
+            if keyword or site_host:
+                site_index.append((keyword, site_host, rule))
         
-        self._stats['torrents_controlled'] = controlled_count
+        self._enabled_rules = enabled_rules
+        self._site_index = site_index
+        self._site_automaton = self._build_site_automaton(site_index)
+        self._rule_by_tracker = {}
+        self._rules_cache_key = cache_key
+        return True
     
-    def _find_rule(self, torrent: dict, rules: Dict[int, dict]) -> Optional[dict]:
-        """查找适用的限速规则"""
+    @staticmethod
+    def _build_site_automaton(site_index: List[Tuple[str, str, dict]]):
+        """把所有关键字和域名建成一个Aho-Corasick自动机，一次扫描tracker即可找出全部命中"""
+        if not AHOCORASICK_AVAILABLE or not site_index:
+            return None
+        automaton = ahocorasick.Automaton()
+        for pos, (keyword, site_host, _) in enumerate(site_index):
+            for needle in (keyword, site_host):
+                # 多个站点共用同一字符串时保留靠前的站点
+                if needle and needle not in automaton:
+                    automaton.add_word(needle, pos)
+        automaton.make_automaton()
+        return automaton
+    
+    def _find_rule(self, torrent: dict) -> Optional[dict]:
+        """查找适用的限速规则，同一tracker的匹配结果在规则变化前复用"""
         tracker = torrent.get('tracker', '') or ''
+        
+        memo = self._rule_by_tracker
+        if tracker in memo:
+            return memo[tracker]
+        
         tracker_lower = tracker.lower()
+        rule = self._enabled_rules.get(None)
+        automaton = self._site_automaton
+        if automaton is not None:
+            # 命中多个站点时取站点顺序最靠前的，与逐个匹配的结果一致
+            pos = min((p for _, p in automaton.iter(tracker_lower)), default=None)
+            if pos is not None:
+                rule = self._site_index[pos][2]
+        else:
+            for keyword, site_host, site_rule in self._site_index:
+                if (keyword and keyword in tracker_lower) or (site_host and site_host in tracker_lower):
+                    rule = site_rule
+                    break
         
-        sites = self.db.get_pt_sites()
-        for site in sites:
-            keyword = site.get('tracker_keyword', '') or ''
-            site_id = site.get('id')
-            if site_id not in rules:
-                continue
-            if keyword and keyword.lower() in tracker_lower:
-                return rules[site_id]
-            site_url = site.get('url') or ''
-            if site_url:
-                site_host = (urlparse(site_url).hostname or '').lower()
-                if site_host and site_host in tracker_lower:
-                    return rules[site_id]
-        
-        return rules.get(None)
-    
-    def _process_torrent(self, instance_id: int, client, torrent: dict, rule: dict, now: float):
-        """处理单个种子"""
+        memo[tracker] = rule
+        return rule
+    
+    def _get_or_create_state(self, instance_id: int, torrent: dict, rule: dict,
+                             now: float) -> TorrentLimitState:
+        """获取种子状态，不存在时创建"""
         hash = torrent['hash']
-        tracker = torrent.get('tracker', '')
-        
-        # 获取或创建状态
-        if hash not in self._states:
-            # 获取目标速度 (KiB/s -> B/s)
-            target_kib = rule.get('target_speed_kib', 51200)
-            safety = rule.get('safety_margin', 0.98)
-            target_speed = int(target_kib * 1024 * safety)
-            
-            self._states[hash] = TorrentLimitState(
-                hash=hash,
+        state = self._states.get(hash)
+        if state is None:
+            values = dict(
                 name=torrent.get('name', '')[:30],
-                tracker=tracker,
+                tracker=torrent.get('tracker', ''),
                 instance_id=instance_id,
                 cycle_start=now,
                 cycle_uploaded_start=torrent.get('uploaded', 0),
-                target_speed=target_speed,
+                target_speed=rule['_target_speed'],
             )
+            # 插入加锁，API线程遍历状态时字典大小不会变化
+            with self._lock:
+                state = self._states.get(hash)
+                if state is None:
+                    if self._state_pool:
+                        state = self._state_pool.pop()
+                        state.reinit(hash, **values)
+                    else:
+                        state = TorrentLimitState(hash=hash, **values)
+                    self._states[hash] = state
+        return state
+    
+    def _prune_states(self, now: float):
+        """清理长时间未出现的种子状态，对象放回池中"""
+        cutoff = now - self.STATE_EXPIRE
+        with self._lock:
+            expired = [h for h, st in self._states.items() if st.last_sample_ts < cutoff]
+            for h in expired:
+                state = self._states.pop(h)
+                self._saved_records.pop(h, None)
+                if len(self._state_pool) < self.STATE_POOL_SIZE:
+                    self._state_pool.append(state)
+        if expired:
+            self._log('debug', f"清理了 {len(expired)} 个过期的种子状态")
         
-        state = self._states[hash]
+        stale_keys = [k for k, (fetched_at, _) in list(self._reannounce_cache.items())
+                      if now - fetched_at >= self.SITE_REANNOUNCE_TTL]
+        for k in stale_keys:
+            self._reannounce_cache.pop(k, None)
+    
+    def _process_torrent(self, instance_id: int, client, torrent: dict, rule: dict,
+                         now: float, mono: float):
+        """
+        处理单个种子
+        
+        限速有变化时返回 (状态, 新限速, 原因)，由调用方统一下发
+        """
+        tracker = torrent.get('tracker', '')
+        state = self._get_or_create_state(instance_id, torrent, rule, now)
         
         # 更新目标速度
-        target_kib = rule.get('target_speed_kib', 51200)
-        safety = rule.get('safety_margin', 0.98)
-        state.target_speed = int(target_kib * 1024 * safety)
+        state.target_speed = rule['_target_speed']
         state.tracker = tracker
         state.instance_id = instance_id
         
         # 获取当前数据
         current_uploaded = torrent.get('uploaded', 0)
         current_speed = torrent.get('upspeed', 0)
+        state.last_uploaded = current_uploaded
+        state.last_upspeed = current_speed
+        state.last_sample_ts = now
         
         # 更新Kalman滤波器
-        state.kalman.update(current_speed, now)
+        state.kalman.update(current_speed, mono)
         
         # 获取汇报时间
-        time_left, source = self._get_reannounce_time(client, hash, tracker, state, now)
+        time_left, source = self._get_reannounce_time(client, torrent, state, now)
         state.reannounce_source = source
         
         # 检测周期跳变
@@ -512,25 +860,37 @@ class PrecisionLimitEngine:
             state.cached_time_left = time_left
         
         # 计算限速
-        new_limit, reason = self._calculate_limit(state, current_uploaded, now, time_left)
+        new_limit, reason = self._calculate_limit(state, current_uploaded, now, time_left, mono)
+        
+        # 日志
+        if mono - state.last_log_time > LimitConfig.LOG_INTERVAL:
+            self._log_status(state, current_uploaded, current_speed, time_left, new_limit, reason, now)
+            state.last_log_time = mono
         
-        # 应用限速
         if new_limit != state.last_limit:
-            try:
-                self.qb_manager.set_upload_limit(instance_id, hash, new_limit)
-                state.last_limit = new_limit
-                state.last_limit_reason = reason
-            except Exception as e:
-                self._log('debug', f"设置限速失败: {e}")
+            return state, new_limit, reason
+        return None
+    
+    def _get_site_reannounce(self, helper, tid: int, now: float) -> Optional[float]:
+        """从站点获取汇报剩余秒数，短时间内复用上次结果并按流逝时间倒数"""
+        key = (helper.config.id, tid)
+        cached = self._reannounce_cache.get(key)
+        if cached:
+            fetched_at, seconds = cached
+            age = now - fetched_at
+            if 0 <= age < self.SITE_REANNOUNCE_TTL and seconds - age > 0:
+                return seconds - age
         
-        # 日志
-        if now - state.last_log_time > LimitConfig.LOG_INTERVAL:
-            self._log_status(state, current_uploaded, current_speed, time_left, new_limit, reason)
-            state.last_log_time = now
+        reannounce = helper.get_reannounce_time(tid=tid)
+        if reannounce is not None and reannounce > 0:
+            self._reannounce_cache[key] = (now, reannounce)
+        return reannounce
     
-    def _get_reannounce_time(self, client, hash: str, tracker: str, 
+    def _get_reannounce_time(self, client, torrent: dict,
                             state: TorrentLimitState, now: float) -> Tuple[float, str]:
         """获取汇报剩余时间"""
+        hash = torrent['hash']
+        tracker = torrent.get('tracker', '')
         time_left = state.cached_time_left
         
         # 方法1：从站点网页获取
@@ -545,7 +905,7 @@ class PrecisionLimitEngine:
                             state.site_id = info.site_id
                     
                     if state.tid:
-                        reannounce = helper.get_reannounce_time(tid=state.tid)
+                        reannounce = self._get_site_reannounce(helper, state.tid, now)
                         if reannounce is not None and reannounce > 0:
                             self._stats['site_success'] += 1
                             return float(reannounce), "site"
@@ -553,9 +913,13 @@ class PrecisionLimitEngine:
                 self._log('debug', f"站点获取汇报时间失败: {e}")
         
         # 方法2：从qB API获取
+        # 新版qB的种子列表已带reannounce字段，无需再逐个请求properties
         try:
-            props = client.torrents_properties(torrent_hash=hash)
-            reannounce = props.get('reannounce', 0) or 0
+            reannounce = torrent.get('reannounce')
+            if reannounce is None:
+                props = client.torrents_properties(torrent_hash=hash)
+                reannounce = props.get('reannounce', 0)
+            reannounce = reannounce or 0
             if 0 < reannounce < 86400:
                 state.reannounce_time = now + reannounce
                 self._stats['qb_api_success'] += 1
@@ -573,87 +937,47 @@ class PrecisionLimitEngine:
         return time_left, "cached"
     
     def _calculate_limit(self, state: TorrentLimitState, current_uploaded: int, 
-                         now: float, time_left: float) -> Tuple[int, str]:
+                         now: float, time_left: float, mono: float) -> Tuple[int, str]:
         """计算限速值"""
-        phase = state.get_phase(now)
-        state.pid.set_phase(phase)
+        phase_code = PHASE_CODES[state.get_phase(now)]
+        state.pid.set_phase(phase_code)
+        
+        if time_left <= 0:
+            return -1, "汇报中"
         
         elapsed = now - state.cycle_start
-        total_cycle_time = elapsed + time_left
-        target_total = state.target_speed * total_cycle_time
+        target_total = state.target_speed * (elapsed + time_left)
         cycle_uploaded = state.get_cycle_uploaded(current_uploaded)
-        need_upload = max(0, target_total - cycle_uploaded)
-        progress = safe_div(cycle_uploaded, target_total, 0)
         
-        if time_left <= 0:
-            return -1, "汇报中"
+        pid_output = state.pid.update(target_total, cycle_uploaded, mono)
+        headroom = PHASE_PARAMS[phase_code][4]
+        predicted_upload = state.kalman.predict_upload(time_left) if phase_code == PHASE_FINISH else 0.0
         
-        required_speed = need_upload / time_left
-        pid_output = state.pid.update(target_total, cycle_uploaded, now)
-        params = LimitConfig.PID_PARAMS.get(phase, LimitConfig.PID_PARAMS['catch'])
-        headroom = params.get('headroom', 1.02)
-        
-        src_tag = {"site": "🌐", "qb_api": "📡", "estimated": "⏱", "cached": "💾"}.get(
-            state.reannounce_source, "❓"
-        )
-        
-        if phase == 'finish':
-            predicted_ratio = safe_div(cycle_uploaded + state.kalman.predict_upload(time_left), target_total, 0)
-            if predicted_ratio > 1.002:
-                correction = max(0.8, 1 - (predicted_ratio - 1) * 3)
-            elif predicted_ratio < 0.998:
-                correction = min(1.2, 1 + (1 - predicted_ratio) * 3)
-            else:
-                correction = 1.0
-            limit = int(required_speed * pid_output * correction)
-            reason = f"F:{int(required_speed/1024)}K{src_tag}"
-            
-        elif phase == 'steady':
-            limit = int(required_speed * headroom * pid_output)
-            reason = f"S:{int(required_speed/1024)}K{src_tag}"
-            
-        elif phase == 'catch':
-            if required_speed > state.target_speed * 5:
-                limit = -1
-                reason = f"C:欠速{src_tag}"
-            else:
-                limit = int(required_speed * headroom * pid_output)
-                reason = f"C:{int(required_speed/1024)}K{src_tag}"
-                
-        else:
-            if progress >= 1.0:
-                limit = LimitConfig.MIN_LIMIT
-                reason = f"W:超{int((progress-1)*100)}%{src_tag}"
-            elif progress >= 0.8:
-                limit = int(required_speed * 1.01 * pid_output)
-                reason = f"W:精控{src_tag}"
-            elif progress >= 0.5:
-                limit = int(required_speed * 1.05)
-                reason = f"W:温控{src_tag}"
-            else:
-                limit = -1
-                reason = f"W:预热{src_tag}"
+        limit, reason_code, required_speed, progress = _calc_limit_core(
+            phase_code, state.target_speed, target_total, cycle_uploaded,
+            time_left, pid_output, headroom, predicted_upload)
         
-        if limit > 0:
-            limit = max(LimitConfig.MIN_LIMIT, min(LimitConfig.MAX_LIMIT, limit))
-            step = 1024 if phase == 'finish' else 4096
-            limit = int((limit + step // 2) // step) * step
+        src_tag = _SRC_TAG.get(state.reannounce_source, "❓")
+        reason = _REASON_FORMATS[reason_code].format(
+            k=int(required_speed / 1024), p=int((progress - 1) * 100)) + src_tag
         
         return limit, reason
     
     def _log_status(self, state: TorrentLimitState, uploaded: int, speed: float,
-                    time_left: float, limit: int, reason: str):
+                    time_left: float, limit: int, reason: str, now: float):
         """记录状态日志"""
-        phase = state.get_phase(time.time())
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        phase = state.get_phase(now)
         cycle_uploaded = state.get_cycle_uploaded(uploaded)
         
-        elapsed = time.time() - state.cycle_start
+        elapsed = now - state.cycle_start
         total_time = elapsed + time_left
         target_total = state.target_speed * total_time
         progress = safe_div(cycle_uploaded, target_total, 0) * 100
         
         limit_str = 'MAX' if limit == -1 else f'{limit//1024}K'
-        phase_emoji = {'warmup': '🔥', 'catch': '🏃', 'steady': '⚖️', 'finish': '🎯'}.get(phase, '❓')
+        phase_emoji = _PHASE_EMOJI.get(phase, '❓')
         
         self._log('info', 
             f"[{state.name[:12]}] {phase_emoji} ↑{fmt_speed(speed)} "
@@ -667,30 +991,21 @@ class PrecisionLimitEngine:
             **self._stats
         }
     
-    def get_state(self, hash: str) -> Optional[Dict[str, Any]]:
+    def get_state(self, hash: str, now: float = None) -> Optional[Dict[str, Any]]:
         """获取单个种子的状态"""
         state = self._states.get(hash)
         if not state:
             return None
         
-        now = time.time()
+        if now is None:
+            now = time.time()
         cycle_time_left = max(0, state.reannounce_time - now) if state.reannounce_time > 0 else state.cached_time_left
         cycle_duration = now - state.cycle_start if state.cycle_start > 0 else 0
         
-        # 获取当前种子的上传信息
-        current_uploaded = 0
-        current_speed = 0
-        try:
-            for inst_id, client in self.qb_manager._clients.items():
-                if client:
-                    torrents = client.torrents_info(hashes=hash)
-                    if torrents:
-                        t = torrents[0]
-                        current_uploaded = t.uploaded
-                        current_speed = t.upspeed
-                        break
-        except:
-            pass
+        # 上传信息取自引擎最近一轮的采样，不再逐个请求qB
+        current_uploaded = state.last_uploaded
+        current_speed = state.last_upspeed
+        stale = now - state.last_sample_ts > self.SAMPLE_STALE_AFTER
         
         # 计算周期内上传量
         cycle_uploaded = state.get_cycle_uploaded(current_uploaded)
@@ -720,6 +1035,7 @@ class PrecisionLimitEngine:
             'last_limit': state.last_limit,
             'last_limit_reason': state.last_limit_reason,
             'current_speed': current_speed,
+            'stale': stale,
             'cycle_uploaded': cycle_uploaded,
             'cycle_avg_speed': cycle_avg_speed,
             'target_upload': target_upload,
@@ -734,8 +1050,11 @@ class PrecisionLimitEngine:
     def get_all_states(self) -> List[Dict[str, Any]]:
         """获取所有种子状态"""
         states = []
-        for h in self._states.keys():
-            s = self.get_state(h)
+        with self._lock:
+            hashes = list(self._states.keys())
+        now = time.time()
+        for h in hashes:
+            s = self.get_state(h, now)
             if s:
                 states.append(s)
         return states
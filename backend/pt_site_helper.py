@@ -893,6 +893,7 @@ class PTSiteHelperManager:
         self.logger = logger or logging.getLogger("pt_helper_manager")
         self._helpers: Dict[int, PTSiteHelper] = {}  # site_id -> helper
         self._tracker_map: Dict[str, int] = {}  # tracker_keyword -> site_id
+        self._tracker_cache: Dict[str, Optional[int]] = {}  # tracker_url -> site_id，映射变化时清空
         self._lock = threading.RLock()  # 使用可重入锁，避免嵌套调用死锁
     
     def add_site(self, site_config: PTSiteConfig, proxy: str = "") -> PTSiteHelper:
@@ -917,6 +918,7 @@ class PTSiteHelperManager:
             except:
                 pass
             
+            self._tracker_cache = {}
             return helper
     
     def remove_site(self, site_id: int):
@@ -928,6 +930,7 @@ class PTSiteHelperManager:
             
             # 清理tracker映射
             self._tracker_map = {k: v for k, v in self._tracker_map.items() if v != site_id}
+            self._tracker_cache = {}
     
     def get_helper(self, site_id: int) -> Optional[PTSiteHelper]:
         """获取站点辅助器"""
@@ -938,13 +941,24 @@ class PTSiteHelperManager:
         if not tracker_url:
             return None
         
+        # 同一tracker每轮都会查询，匹配结果缓存到映射变化为止
+        cache = self._tracker_cache
+        if tracker_url in cache:
+            site_id = cache[tracker_url]
+            return self._helpers.get(site_id) if site_id is not None else None
+        
         tracker_lower = tracker_url.lower()
         
-        for keyword, site_id in self._tracker_map.items():
+        site_id = None
+        for keyword, sid in self._tracker_map.items():
             if keyword in tracker_lower:
-                return self._helpers.get(site_id)
+                site_id = sid
+                break
         
-        return None
+        if len(cache) >= 4096:
+            cache.clear()
+        cache[tracker_url] = site_id
+        return self._helpers.get(site_id) if site_id is not None else None
     
     def get_reannounce_time(self, torrent_hash: str, tracker_url: str, 
                            qb_reannounce: int = None) -> Tuple[Optional[int], str]:
@@ -42,6 +42,9 @@ class QBManager:
         self._lock = threading.Lock()
         self._free_space_cache: Dict[int, Tuple[int, float]] = {}
         self._cache_ttl = 30
+        # sync/maindata 增量同步状态: instance_id -> (client, rid, {hash: 种子字段}, server_state, 同步时间)
+        self._sync_state: Dict[int, Tuple[Any, int, Dict[str, Dict], Dict, float]] = {}
+        self._sync_locks: Dict[int, threading.Lock] = {}
         self.logger = logging.getLogger("qb_manager")
     
     def connect(self, config: Dict) -> Tuple[bool, str]:
@@ -96,6 +99,7 @@ class QBManager:
                 except:
                     pass
                 del self._instances[instance_id]
+            self._sync_state.pop(instance_id, None)
     
     def get_instance(self, instance_id: int) -> Optional[QBInstance]:
         """获取实例"""
@@ -161,6 +165,15 @@ class QBManager:
         if not client:
             return 0
         
+        # 增量同步仍在进行时直接读取合并后的server_state，
+        # 避免在同一会话上用rid=0请求打断增量同步；同步已停止则重新请求
+        cached = self._sync_state.get(instance_id)
+        if cached and cached[0] is client and time.time() - cached[4] < self._cache_ttl:
+            free_space = cached[3].get('free_space_on_disk')
+            if free_space is not None:
+                self._free_space_cache[instance_id] = (free_space, time.time())
+                return free_space
+        
         try:
             main_data = client.sync_maindata()
             free_space = main_data.get('server_state', {}).get('free_space_on_disk', 0)
@@ -200,6 +213,55 @@ class QBManager:
             self.logger.error(f"获取种子列表失败: {e}")
             return []
     
+    def get_torrents_synced(self, instance_id: int) -> List[Dict]:
+        """
+        通过 sync/maindata 增量同步获取全部种子
+        
+        首次请求返回全量，之后qB只返回变化的字段，响应体和JSON解析量随变化量而不是种子数增长。
+        适合每隔几秒轮询的场景；重新连接后自动从全量重新开始。
+        """
+        client = self.get_client(instance_id)
+        if not client:
+            return []
+        
+        with self._lock:
+            sync_lock = self._sync_locks.setdefault(instance_id, threading.Lock())
+        
+        with sync_lock:
+            cached = self._sync_state.get(instance_id)
+            if cached and cached[0] is client:
+                _, rid, torrents, server_state, _ = cached
+            else:
+                rid, torrents, server_state = 0, {}, {}
+            
+            try:
+                data = client.sync_maindata(rid=rid)
+            except Exception as e:
+                self._sync_state.pop(instance_id, None)
+                self.logger.error(f"同步种子列表失败: {e}")
+                return []
+            
+            if data.get('full_update'):
+                torrents = {}
+                server_state = {}
+            for torrent_hash, fields in (data.get('torrents') or {}).items():
+                torrent = torrents.get(torrent_hash)
+                if torrent is None:
+                    torrents[torrent_hash] = torrent = {'hash': torrent_hash}
+                torrent.update(fields)
+            for torrent_hash in data.get('torrents_removed') or ():
+                torrents.pop(torrent_hash, None)
+            
+            # server_state 同样只返回变化的字段，合并后保存
+            server_state.update(data.get('server_state') or {})
+            free_space = server_state.get('free_space_on_disk')
+            if free_space is not None:
+                self._free_space_cache[instance_id] = (free_space, time.time())
+            
+            self._sync_state[instance_id] = (client, data.get('rid', 0), torrents, server_state, time.time())
+            # 返回副本，调用方修改不会污染同步缓存
+            return [dict(t) for t in torrents.values()]
+    
     def get_torrent(self, instance_id: int, torrent_hash: str) -> Optional[Dict]:
         """获取单个种子信息"""
         client = self.get_client(instance_id)
@@ -251,14 +313,14 @@ class QBManager:
         except Exception as e:
             return False, str(e)
     
-    def delete_torrent(self, instance_id: int, torrent_hash: str, 
+    def delete_torrent(self, instance_id: int, torrent_hash: Union[str, List[str]], 
                        delete_files: bool = False) -> Tuple[bool, str]:
         """
-        删除种子
+        删除种子（支持批量）
         
         Args:
             instance_id: qB实例ID
-            torrent_hash: 种子hash
+            torrent_hash: 种子hash或hash列表
             delete_files: 是否同时删除文件（默认False，自动删种时会传True）
         """
         client = self.get_client(instance_id)
@@ -266,14 +328,22 @@ class QBManager:
             return False, "未连接"
         
         try:
+            # 统一处理为字符串
+            if isinstance(torrent_hash, list):
+                hashes = '|'.join(torrent_hash)
+                label = f"{len(torrent_hash)} 个种子"
+            else:
+                hashes = torrent_hash
+                label = f"{torrent_hash[:8]}..."
+            
             # qbittorrent-api 的 torrents_delete 方法
             # delete_files 参数控制是否删除下载的文件
             client.torrents_delete(
-                torrent_hashes=torrent_hash, 
+                torrent_hashes=hashes, 
                 delete_files=delete_files
             )
             action = "删除种子和文件" if delete_files else "仅删除种子"
-            self.logger.info(f"[{instance_id}] {action}: {torrent_hash[:8]}...")
+            self.logger.info(f"[{instance_id}] {action}: {label}")
             return True, action + "成功"
         except Exception as e:
             self.logger.error(f"删除种子失败: {e}")
@@ -394,13 +464,15 @@ class QBManager:
             self.logger.error(f"获取种子属性失败: {e}")
             return None
     
-    def reannounce(self, instance_id: int, torrent_hash: str) -> Tuple[bool, str]:
-        """重新汇报"""
+    def reannounce(self, instance_id: int, torrent_hash: Union[str, List[str]]) -> Tuple[bool, str]:
+        """重新汇报（支持批量）"""
         client = self.get_client(instance_id)
         if not client:
             return False, "未连接"
         
         try:
+            if isinstance(torrent_hash, list):
+                torrent_hash = '|'.join(torrent_hash)
             client.torrents_reannounce(torrent_hashes=torrent_hash)
             return True, "已重新汇报"
         except Exception as e:
@@ -135,6 +135,11 @@ install_dependencies() {
     pip3 install --break-system-packages flask requests beautifulsoup4 lxml feedparser qbittorrent-api 2>/dev/null || \
     pip3 install flask requests beautifulsoup4 lxml feedparser qbittorrent-api
     
+    # 可选加速组件，安装失败不影响运行
+    pip3 install --break-system-packages numpy orjson pyahocorasick 2>/dev/null || \
+    pip3 install numpy orjson pyahocorasick 2>/dev/null || \
+    print_warn "可选加速组件 (numpy/orjson/pyahocorasick) 安装失败，将使用纯Python实现"
+    
     print_success "依赖安装完成"
 }
 